@@ -1,21 +1,62 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Response, json, request, jsonify, stream_with_context
 import logging
+import threading
+import time
 from pathlib import Path
 
-from utils.helpers import create_upload_dir, allowed_file, cleanup_dir
+from core.cache import Coalescer, create_ocr_cache
+from utils.helpers import (
+    create_upload_dir, allowed_file, allowed_suffixes, cleanup_dir, matches_signature, save_upload,
+    stream_sha256, sweep_uploads
+)
 
 logger = logging.getLogger(__name__)
 bp = Blueprint('api', __name__)
 
+def _start_upload_sweeper(upload_folder: Path, retention: float, interval: float) -> None:
+    """Remove expired upload dirs from a daemon thread every interval seconds"""
+    def sweep():
+        while True:
+            time.sleep(interval)
+            try:
+                removed = sweep_uploads(upload_folder, retention)
+                if removed:
+                    logger.info(f"Removed {removed} expired upload dir(s)")
+            except Exception as e:
+                logger.warning(f"Upload sweep failed: {e}", exc_info=True)
+
+    threading.Thread(target=sweep, name='upload-sweeper', daemon=True).start()
+
 def init_api(ocr_processor, document_analyzer, config):
     """Initialize API routes with dependencies"""
+    ocr_cache = create_ocr_cache(config)
+    # OCR runs in progress, keyed by upload content hash
+    ocr_runs = Coalescer()
+    ocr_slots = threading.BoundedSemaphore(config.OCR_MAX_PENDING)
+    analysis_slots = threading.BoundedSemaphore(config.AI_MAX_PENDING)
+    upload_suffixes = allowed_suffixes(config.ALLOWED_EXTENSIONS)
+    upload_folder = Path(config.UPLOAD_FOLDER)
+    if config.KEEP_FILES and config.UPLOAD_RETENTION:
+        _start_upload_sweeper(upload_folder, config.UPLOAD_RETENTION, config.UPLOAD_SWEEP_INTERVAL)
+
+    def cached_response(digest):
+        """Return the cached OCR response for a digest, unless its previews were swept"""
+        cached = ocr_cache.get(digest)
+        if cached is None:
+            return None
+        for page in cached['pages']:
+            preview = page['preview']
+            if preview.startswith('/uploads/') and \
+                    not (upload_folder / preview[len('/uploads/'):]).is_file():
+                return None
+        return cached
     
     @bp.route('/ocr', methods=['POST'])
     def ocr_endpoint():
         """Handle OCR processing requests"""
         logger.info("Received OCR request")
-        logger.debug(f"Request headers: {dict(request.headers)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Request headers: {dict(request.headers)}")
         
         if 'file' not in request.files:
             logger.error("No file in request")
@@ -26,59 +67,191 @@ def init_api(ocr_processor, document_analyzer, config):
             logger.error("Empty filename")
             return jsonify({'error': 'No file selected'}), 400
             
-        if not allowed_file(file.filename, config.ALLOWED_EXTENSIONS):
+        if not allowed_file(file.filename, upload_suffixes):
             logger.error(f"Invalid file type: {file.filename}")
             return jsonify({'error': 'File type not allowed'}), 400
+
+        # Empty or mislabeled files are rejected before hashing or loading them into Paddle
+        if not matches_signature(file.stream, file.filename.rsplit('.', 1)[1].lower()):
+            logger.error(f"File content does not match its type: {file.filename}")
+            return jsonify({'error': 'File is empty or not a valid image or PDF'}), 400
             
         try:
-            upload_dir = create_upload_dir(Path(config.UPLOAD_FOLDER))
-            filename = secure_filename(file.filename)
-            filepath = upload_dir / filename
-            
-            logger.info(f"Saving file to: {filepath}")
-            file.save(filepath)
-            
-            try:
-                if filename.lower().endswith('.pdf'):
-                    pages_data = ocr_processor.process_pdf(filepath, upload_dir)
-                    response_data = {
-                        'isPdf': True,
-                        'totalPages': len(pages_data),
-                        'pages': pages_data
-                    }
-                else:
-                    pages_data = ocr_processor.process_image(filepath)
-                    response_data = {
-                        'isPdf': False,
-                        'totalPages': len(pages_data),
-                        'pages': pages_data
-                    }
-
-                if not config.KEEP_FILES:
-                    cleanup_dir(upload_dir)
-                    
-                return jsonify(response_data)
+            digest = stream_sha256(file.stream)
+            cached = cached_response(digest)
+            if cached is not None:
+                logger.info(f"OCR cache hit for {file.filename} ({digest})")
+                return jsonify(cached)
 
+            # Leave request threads free for other endpoints while OCR is backed up
+            if not ocr_slots.acquire(blocking=False):
+                logger.warning("OCR queue full, rejecting request")
+                return jsonify({'error': 'OCR service busy, please retry'}), 503, {'Retry-After': '5'}
+
+            try:
+                response_data = ocr_runs.run(digest, lambda: process_upload(file, digest))
             except Exception as process_error:
                 logger.error(f"Processing error: {str(process_error)}", exc_info=True)
-                cleanup_dir(upload_dir)
                 return jsonify({'error': str(process_error)}), 500
+            finally:
+                ocr_slots.release()
+
+            return jsonify(response_data)
                 
         except Exception as e:
             logger.error(f"OCR request error: {str(e)}", exc_info=True)
             return jsonify({'error': 'Internal server error'}), 500
 
+    def process_upload(file, digest):
+        """Run OCR on an upload and cache the response"""
+        # A run for the same content may have finished since the first lookup
+        cached = cached_response(digest)
+        if cached is not None:
+            return cached
+
+        # Each upload gets its own directory, so only the validated extension is kept;
+        # secure_filename would strip non-ASCII names like 报告.pdf down to 'pdf'
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        filename = f"upload.{extension}"
+        is_pdf = extension == 'pdf'
+
+        start = time.perf_counter()
+        if not is_pdf and not config.KEEP_FILES:
+            # Nothing needs the image on disk, so OCR it straight from memory
+            pages_data = ocr_processor.process_image_bytes(file.stream.read())
+        else:
+            pages_data = save_and_process(file, filename, is_pdf)
+        logger.info(f"OCR of {len(pages_data)} page(s) finished in {time.perf_counter() - start:.2f}s")
+
+        response_data = {
+            'isPdf': is_pdf,
+            'totalPages': len(pages_data),
+            'pages': pages_data
+        }
+        ocr_cache.set(digest, response_data)
+        return response_data
+
+    def save_and_process(file, filename, is_pdf):
+        """Save an upload to its own directory and run OCR on the saved file"""
+        upload_dir = create_upload_dir(upload_folder)
+        filepath = upload_dir / filename
+
+        try:
+            logger.info(f"Saving file to: {filepath}")
+            save_upload(file, filepath)
+
+            if is_pdf:
+                pages_data = ocr_processor.process_pdf(filepath, upload_dir)
+            else:
+                pages_data = ocr_processor.process_image(filepath)
+        except Exception:
+            cleanup_dir(upload_dir)
+            raise
+
+        if not config.KEEP_FILES:
+            cleanup_dir(upload_dir)
+
+        return pages_data
+
     @bp.route('/analyze', methods=['POST'])
     def analyze_endpoint():
         """Handle AI analysis requests"""
-        if not request.is_json or 'text' not in request.json:
+        pages = None
+        if request.mimetype == 'text/plain':
+            # Plain-text bodies skip JSON parsing entirely
+            text = request.get_data(cache=False, as_text=True)
+        else:
+            payload = request.get_json(silent=True)
+            payload = payload if isinstance(payload, dict) else {}
+            text = payload.get('text')
+            pages = payload.get('pages')
+
+        if pages is not None:
+            if not isinstance(pages, list) or not pages or \
+                    not all(isinstance(page, str) for page in pages):
+                return jsonify({'error': 'Pages must be a non-empty list of strings'}), 400
+        elif not isinstance(text, str) or not text:
             return jsonify({'error': 'No text provided'}), 400
             
+        # LLM calls hold a request thread for the whole generation; keep some threads for OCR
+        if not analysis_slots.acquire(timeout=config.AI_PENDING_TIMEOUT):
+            logger.warning("Analysis queue full, rejecting request")
+            return jsonify({'error': 'Analysis service busy, please retry'}), 503, {'Retry-After': '5'}
+
         try:
-            analysis = document_analyzer.analyze_text(request.json['text'])
+            if pages is not None:
+                # Analyze pages concurrently and merge the results in page order
+                analysis = '\n\n'.join(document_analyzer.analyze_pages(pages))
+            else:
+                analysis = document_analyzer.analyze_text(text)
             return jsonify({'analysis': analysis})
         except Exception as e:
             logger.error(f"Analysis error: {str(e)}", exc_info=True)
             return jsonify({'error': 'Failed to analyze text'}), 500
+        finally:
+            analysis_slots.release()
+
+    @bp.route('/analyze_image', methods=['POST'])
+    def analyze_image_endpoint():
+        """Analyze an uploaded image with a multimodal model instead of OCR"""
+        if not config.AI_MULTIMODAL:
+            return jsonify({'error': 'Image analysis is not enabled'}), 404
+
+        file = request.files.get('file')
+        if file is None or not file.filename:
+            return jsonify({'error': 'No file provided'}), 400
+        if not allowed_file(file.filename, upload_suffixes) or \
+                file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'File type not allowed'}), 400
+        if not matches_signature(file.stream, file.filename.rsplit('.', 1)[1].lower()):
+            return jsonify({'error': 'File is empty or not a valid image'}), 400
+
+        if not analysis_slots.acquire(timeout=config.AI_PENDING_TIMEOUT):
+            logger.warning("Analysis queue full, rejecting request")
+            return jsonify({'error': 'Analysis service busy, please retry'}), 503, {'Retry-After': '5'}
+
+        try:
+            mimetype = file.mimetype if file.mimetype.startswith('image/') else 'image/jpeg'
+            analysis = document_analyzer.analyze_image(file.stream.read(), mimetype)
+            return jsonify({'analysis': analysis})
+        except Exception as e:
+            logger.error(f"Image analysis error: {str(e)}", exc_info=True)
+            return jsonify({'error': 'Failed to analyze image'}), 500
+        finally:
+            analysis_slots.release()
+
+    @bp.route('/analyze_stream', methods=['POST'])
+    def analyze_stream_endpoint():
+        """Stream AI analysis to the client as server-sent events"""
+        if request.mimetype == 'text/plain':
+            text = request.get_data(cache=False, as_text=True)
+        else:
+            payload = request.get_json(silent=True)
+            text = payload.get('text') if isinstance(payload, dict) else None
+
+        if not text or not isinstance(text, str):
+            return jsonify({'error': 'No text provided'}), 400
+
+        def generate():
+            try:
+                for delta in document_analyzer.analyze_text_stream(text):
+                    yield f"data: {json.dumps({'delta': delta})}\n\n"
+                yield "data: [DONE]\n\n"
+            except Exception as e:
+                logger.error(f"Analysis stream error: {str(e)}", exc_info=True)
+                yield f"event: error\ndata: {json.dumps({'error': 'Failed to analyze text'})}\n\n"
+
+        if not analysis_slots.acquire(timeout=config.AI_PENDING_TIMEOUT):
+            logger.warning("Analysis queue full, rejecting request")
+            return jsonify({'error': 'Analysis service busy, please retry'}), 503, {'Retry-After': '5'}
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # The slot is held until the stream is finished or the client goes away
+        response.call_on_close(analysis_slots.release)
+        return response
 
     return bp
\ No newline at end of file
@@ -1,22 +1,30 @@
-from flask import Flask
+from flask import Flask, abort, send_from_directory
 from flask_cors import CORS
 import os
 from pathlib import Path
 
 from config.settings import config
 from utils.logger import setup_logger
+from utils.json_provider import OrjsonProvider
+from utils.request import UploadRequest
 #from core.ocr import OCRProcessor
 from core.ocr.factory import OCREngineFactory
 from core.analyzer import DocumentAnalyzer
 from api.routes import init_api
 
-def create_app(config_name='default'):
-    """Application factory"""
+def create_app(config_name='default', use_reloader=False):
+    """Application factory; use_reloader is set when the Werkzeug reloader runs it"""
     app = Flask(__name__, static_url_path='', static_folder='static')
     
     # Load configuration
     app_config = config[config_name]
     app.config.from_object(app_config)
+
+    # Serialize JSON responses with orjson
+    app.json = OrjsonProvider(app)
+
+    # Spool large uploads where they can be hard-linked into place
+    app.request_class = UploadRequest
     
     # Setup logging
     logger = setup_logger(app)
@@ -26,33 +34,63 @@ def create_app(config_name='default'):
     
     # Ensure required directories exist
     Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
+    Path(app.config['UPLOAD_SPOOL_FOLDER']).mkdir(parents=True, exist_ok=True)
     
-    # Initialize core components
-    ocr_engine = OCREngineFactory.create(app_config.OCR_ENGINE, app_config)
+    # Under the reloader only the child process (WERKZEUG_RUN_MAIN) serves requests;
+    # the watcher process never does, so it skips loading the OCR models
+    is_reloader_parent = use_reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    if not is_reloader_parent:
+        # Initialize core components
+        ocr_engine = OCREngineFactory.create(app_config.OCR_ENGINE, app_config)
+        if app_config.OCR_WARMUP:
+            ocr_engine.warmup()
 
-    # ocr_processor = OCRProcessor(app_config)
-    document_analyzer = DocumentAnalyzer(app_config)
+        # ocr_processor = OCRProcessor(app_config)
+        document_analyzer = DocumentAnalyzer(app_config)
 
-    # Register blueprints
-    api_bp = init_api(ocr_engine, document_analyzer, app_config)
-    app.register_blueprint(api_bp, url_prefix='/api')
+        # Register blueprints
+        api_bp = init_api(ocr_engine, document_analyzer, app_config)
+        app.register_blueprint(api_bp, url_prefix='/api')
     
     @app.route('/')
     def index():
-        return app.send_static_file('index.html')
+        return send_from_directory(app.static_folder, 'index.html',
+                                   max_age=app_config.INDEX_MAX_AGE)
+
+    @app.route('/uploads/<path:filename>')
+    def serve_upload(filename):
+        # Temp and spool files are dot-prefixed and never served
+        if any(part.startswith('.') for part in filename.split('/')):
+            abort(404)
+        # Previews are patient documents: only the browser may cache them, and
+        # not for longer than the upload itself is kept
+        max_age = app_config.UPLOAD_MAX_AGE
+        if app_config.UPLOAD_RETENTION:
+            max_age = min(max_age, app_config.UPLOAD_RETENTION)
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                       max_age=max_age)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
     
     return app
 
 def main():
     """Main entry point"""
     env = os.getenv('FLASK_ENV', 'default')
-    app = create_app(env)
-    
+    if not config[env].DEBUG:
+        # The Werkzeug server is for development only
+        print(f"Run the {env} server with: gunicorn -c gunicorn_conf.py \"app:create_app('{env}')\"")
+        return
+
+    # Only an explicit development env gets the interactive debugger and reloader
+    debug = env == 'development'
+    app = create_app(env, use_reloader=debug)
     app.run(
         host='0.0.0.0',
         port=int(os.getenv('PORT', 8000)),
-        debug=env == 'development',
-        use_reloader=env == 'development',
+        debug=debug,
+        use_reloader=debug,
         threaded=True
     )
 
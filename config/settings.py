@@ -4,6 +4,9 @@ from pathlib import Path
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Request threads per gunicorn worker (gunicorn_conf.py exports the count)
+REQUEST_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+
 # App configuration
 class Config:
     # Flask configuration
@@ -11,28 +14,120 @@ class Config:
     TESTING = False
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
+    # Browser cache lifetimes (seconds); static assets aren't fingerprinted
+    SEND_FILE_MAX_AGE_DEFAULT = 86400
+    INDEX_MAX_AGE = 3600
+
+    # Logging configuration
+    LOG_LEVEL = 'DEBUG'
 
     # Upload configuration
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
-    KEEP_FILES = True
+    # Large uploads are spooled here; keep it outside UPLOAD_FOLDER (which is served publicly)
+    # but on the same filesystem so spooled files can be hard-linked into place
+    UPLOAD_SPOOL_FOLDER = BASE_DIR / 'incoming'
+    ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'pdf'})
+    KEEP_FILES = True  # Off: each upload dir is deleted as soon as its OCR finishes
+    # Kept upload dirs older than this many seconds are swept; unset keeps them indefinitely
+    UPLOAD_RETENTION = int(os.environ['UPLOAD_RETENTION']) if os.environ.get('UPLOAD_RETENTION') else None
+    UPLOAD_SWEEP_INTERVAL = 10 * 60  # Seconds between sweeps for expired upload dirs
+    UPLOAD_MAX_AGE = 60 * 60  # Private browser cache lifetime of /uploads previews, capped at UPLOAD_RETENTION
+    # Embed page previews as base64 instead of serving them from /uploads;
+    # always on when KEEP_FILES is off, since nothing is left on disk to serve
+    INLINE_PREVIEWS = False
 
     # OCR configuration
     OCR_ENGINE = 'paddle'  # Which OCR engine to use
     OCR_LANG = 'ch'
-    USE_ANGLE_CLS = True
+    OCR_VERSION = 'PP-OCRv4'  # Mobile det/rec models
+    # Fast mode caps detector input at 640px and skips angle classification;
+    # set OCR_FAST_MODE=0 for accuracy-sensitive deployments
+    OCR_FAST_MODE = os.environ.get('OCR_FAST_MODE', '1') != '0'
+    OCR_DET_LIMIT_SIDE_LEN = 640 if OCR_FAST_MODE else 960
+    USE_ANGLE_CLS = not OCR_FAST_MODE
+    OCR_MAX_LONG_EDGE = 1920  # Uploaded images are downscaled to this before OCR; 0 disables
+    OCR_WARMUP = True  # Run a dummy inference at startup
+    # Processes sharing this machine's cores and GPU memory; gunicorn_conf.py sets it to the worker count
+    OCR_PROCESSES = max(1, int(os.environ.get('OCR_PROCESSES', 1)))
+    # PaddleOCR instances per process, so concurrent requests OCR in parallel;
+    # by default every process together holds about one instance per core
+    OCR_POOL_SIZE = int(os.environ.get(
+        'OCR_POOL_SIZE', max(1, min(4, (os.cpu_count() or 1) // OCR_PROCESSES))
+    ))
+    # OCR requests running or queued per process before answering 503; one request thread
+    # stays free so a burst of uploads can't block analysis and static files
+    OCR_MAX_PENDING = int(os.environ.get('OCR_MAX_PENDING', max(1, REQUEST_THREADS - 1)))
+
+    # PDF rendering configuration
+    PDF_DPI = 150  # Detection downsizes pages anyway; 150 DPI keeps body text legible
+    PDF_USE_PDFTOCAIRO = True
+    PDF_JPEG_QUALITY = 80
+    PDF_RENDER_THREADS = os.cpu_count() or 1  # Pages rendered in parallel per chunk
+    # CPU inference, used when no CUDA device is available
+    OCR_ENABLE_MKLDNN = True  # oneDNN kernels for CPU inference
+    OCR_CPU_THREADS = os.cpu_count() or 1  # Split across every process's pooled engines
+    OCR_PRECISION = os.environ.get('OCR_PRECISION', 'fp32')
+    # CPU predictors run crops sequentially, so batching only grows the memory arena
+    OCR_REC_BATCH_NUM = int(os.environ.get('OCR_REC_BATCH_NUM', 1))
+    # GPU inference; fp16 takes effect with TensorRT, which must be installed
+    OCR_USE_TENSORRT = os.environ.get('OCR_USE_TENSORRT', '0') == '1'
+    OCR_GPU_PRECISION = os.environ.get('OCR_GPU_PRECISION', 'fp16')
+    # MB of each GPU budgeted for OCR. PaddleOCR passes gpu_mem to every det/rec/cls predictor,
+    # so the budget is split across those, the pooled engines and the processes sharing the GPU
+    OCR_GPU_MEM = 4000
+    # Processes on one GPU; gunicorn_conf.py sets it from the worker count and OCR_GPUS
+    OCR_PROCESSES_PER_GPU = max(1, int(os.environ.get('OCR_PROCESSES_PER_GPU', OCR_PROCESSES)))
+    OCR_GPU_REC_BATCH_NUM = 32  # Text crops classified/recognized per GPU batch (PaddleOCR default: 6)
+    # Autotune cuDNN conv algorithms; each new input shape pays a search, so warmup only covers 640x640
+    OCR_CUDNN_EXHAUSTIVE_SEARCH = os.environ.get('OCR_CUDNN_EXHAUSTIVE_SEARCH', '0') == '1'
+    # Run ONNX models through onnxruntime; every model dir must then point at a .onnx file
+    OCR_USE_ONNX = os.environ.get('OCR_USE_ONNX', '0') == '1'
+    OCR_DET_MODEL_DIR = os.environ.get('OCR_DET_MODEL_DIR')
+    OCR_REC_MODEL_DIR = os.environ.get('OCR_REC_MODEL_DIR')
+    OCR_CLS_MODEL_DIR = os.environ.get('OCR_CLS_MODEL_DIR')
+    # onnxruntime execution providers in priority order,
+    # e.g. "CUDAExecutionProvider,OpenVINOExecutionProvider,CPUExecutionProvider"
+    OCR_ONNX_PROVIDERS = [
+        provider.strip()
+        for provider in os.environ.get('OCR_ONNX_PROVIDERS', '').split(',')
+        if provider.strip()
+    ]
+    OCR_CACHE_MEMORY_MB = 64  # Per-process budget for cached OCR responses, keyed by upload content hash
+    # Share cached OCR responses across workers (requires the redis package)
+    OCR_CACHE_REDIS_URL = os.environ.get('OCR_CACHE_REDIS_URL')
+    OCR_CACHE_TTL = 24 * 60 * 60  # Seconds a shared cache entry is kept
+    # Persist cached OCR responses on disk across restarts (used when Redis isn't configured)
+    OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR')
+    OCR_CACHE_MAX_MB = 1024  # Least recently used disk entries are evicted past this size
 
     # API configuration
     AI_API_BASE_URL = "http://10.0.0.100:5000/v1"
     AI_API_KEY = "not-needed"
+    AI_HTTP2 = True  # Multiplex concurrent requests over one connection (needs h2)
+    AI_REQUEST_TIMEOUT = 120.0  # Seconds; long records can take a while to generate
+    AI_MAX_CONNECTIONS = 256
+    AI_MAX_KEEPALIVE_CONNECTIONS = 64
+    AI_KEEPALIVE_EXPIRY = 600.0  # Seconds an idle connection is kept for reuse (httpx default: 5)
+    AI_CONNECT_TIMEOUT = 2.0  # The LLM server is on the local network
+    AI_MAX_CONCURRENT_REQUESTS = 32  # Per-page analyses in flight at once
+    # The AI endpoint serves a vision model; enables /api/analyze_image, which skips OCR
+    AI_MULTIMODAL = os.environ.get('AI_MULTIMODAL', '0') == '1'
+    # Analysis requests per process; one request thread stays free for OCR
+    AI_MAX_PENDING = int(os.environ.get('AI_MAX_PENDING', max(1, REQUEST_THREADS - 1)))
+    AI_PENDING_TIMEOUT = 5.0  # Seconds an analysis request waits for a slot before answering 503
+    AI_CACHE_SIZE = 512  # Cached analyses, keyed by OCR text hash
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    SEND_FILE_MAX_AGE_DEFAULT = None
+    INDEX_MAX_AGE = None
 
 class ProductionConfig(Config):
     # Production-specific settings
     DEBUG = False
     KEEP_FILES = False
+    INLINE_PREVIEWS = True
+    LOG_LEVEL = 'INFO'
 
 class TestingConfig(Config):
     TESTING = True
@@ -1,40 +1,155 @@
+import base64
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+import httpx
 from openai import OpenAI
 
+from core.cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
 class DocumentAnalyzer:
     def __init__(self, config):
         self.client = OpenAI(
             base_url=config.AI_API_BASE_URL,
-            api_key=config.AI_API_KEY
+            api_key=config.AI_API_KEY,
+            http_client=httpx.Client(
+                http2=config.AI_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=config.AI_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.AI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.AI_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(
+                    connect=config.AI_CONNECT_TIMEOUT,
+                    read=config.AI_REQUEST_TIMEOUT,
+                    write=10.0,
+                    pool=5.0
+                )
+            )
+        )
+        # Bounds concurrent per-page LLM calls so the upstream server isn't flooded
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.AI_MAX_CONCURRENT_REQUESTS,
+            thread_name_prefix='analyze'
         )
+        # Completions run at temperature 0, so identical text gets the same answer
+        self._cache = LRUCache(config.AI_CACHE_SIZE)
 
     def analyze_text(self, text: str) -> str:
         """Analyze OCR text using AI"""
+        key = self._cache_key(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            logger.info("AI analysis cache hit")
+            return cached
+
         try:
             logger.info("Starting AI analysis")
-            prompt = self._create_prompt(text)
+            completion = self.client.chat.completions.create(
+                **self._completion_kwargs(text)
+            )
             
+            analysis = completion.choices[0].message.content
+            self._cache.set(key, analysis)
+            return analysis
+
+        except Exception as e:
+            logger.error(f"AI analysis error: {e}", exc_info=True)
+            raise
+
+    def analyze_image(self, data: bytes, mimetype: str) -> str:
+        """Analyze a scanned image directly with a multimodal model, skipping OCR"""
+        key = 'image:' + hashlib.blake2b(data, digest_size=16).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            logger.info("AI image analysis cache hit")
+            return cached
+
+        try:
+            logger.info(f"Starting AI image analysis ({len(data)} bytes)")
+            image_url = f"data:{mimetype};base64,{base64.b64encode(data).decode('utf-8')}"
             completion = self.client.chat.completions.create(
                 model="any-model",
                 messages=[
                     {"role": "system", "content": "You are a medical record formatter."},
-                    {"role": "user", "content": prompt}
+                    {"role": "user", "content": [
+                        {"type": "text", "text": self._create_image_prompt()},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]}
                 ],
                 temperature=0
             )
-            
-            return completion.choices[0].message.content
+
+            analysis = completion.choices[0].message.content
+            self._cache.set(key, analysis)
+            return analysis
+
+        except Exception as e:
+            logger.error(f"AI image analysis error: {e}", exc_info=True)
+            raise
+
+    def analyze_text_stream(self, text: str) -> Iterator[str]:
+        """Analyze OCR text using AI, yielding the analysis as it is generated"""
+        key = self._cache_key(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            logger.info("AI analysis cache hit")
+            yield cached
+            return
+
+        try:
+            logger.info("Starting streamed AI analysis")
+            stream = self.client.chat.completions.create(
+                **self._completion_kwargs(text), stream=True
+            )
+
+            parts = []
+            with stream:
+                for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        parts.append(content)
+                        yield content
+            self._cache.set(key, ''.join(parts))
 
         except Exception as e:
             logger.error(f"AI analysis error: {e}", exc_info=True)
             raise
 
+    def analyze_pages(self, pages: List[str]) -> List[str]:
+        """Analyze each page's OCR text concurrently, preserving page order"""
+        logger.info(f"Starting AI analysis of {len(pages)} pages")
+        return list(self._executor.map(self.analyze_text, pages))
+
+    @staticmethod
+    def _cache_key(text: str) -> str:
+        """Hash OCR text into an analysis cache key"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _completion_kwargs(self, text: str) -> Dict:
+        """Build chat completion arguments for analyzing OCR text"""
+        return {
+            'model': "any-model",
+            'messages': [
+                {"role": "system", "content": "You are a medical record formatter."},
+                {"role": "user", "content": self._create_prompt(text)}
+            ],
+            'temperature': 0
+        }
+
     @staticmethod
     def _create_prompt(text: str) -> str:
         """Create analysis prompt"""
         return f"""based on the scanned ocr text, form a human readable person medical record in two column
         
 OCR Text:
-{text}"""
\ No newline at end of file
+{text}"""
+
+    @staticmethod
+    def _create_image_prompt() -> str:
+        """Create analysis prompt for a scanned image"""
+        return "based on the scanned image, form a human readable person medical record in two column"
@@ -0,0 +1,258 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Settings that change the OCR response for the same upload; persistent caches
+# keep entries apart per combination so a config change never serves stale results
+RESULT_SETTINGS = (
+    'OCR_ENGINE', 'OCR_LANG', 'OCR_VERSION', 'OCR_DET_LIMIT_SIDE_LEN', 'USE_ANGLE_CLS',
+    'OCR_MAX_LONG_EDGE', 'PDF_DPI', 'PDF_JPEG_QUALITY', 'OCR_USE_ONNX',
+    'OCR_DET_MODEL_DIR', 'OCR_REC_MODEL_DIR', 'OCR_CLS_MODEL_DIR',
+    'INLINE_PREVIEWS', 'KEEP_FILES'
+)
+
+
+def config_fingerprint(config) -> str:
+    """Hash the OCR-relevant settings into a short cache namespace"""
+    values = '\0'.join(repr(getattr(config, name, None)) for name in RESULT_SETTINGS)
+    return hashlib.blake2b(values.encode('utf-8'), digest_size=6).hexdigest()
+
+
+class LRUCache:
+    """Bounded, thread-safe in-memory LRU cache keyed by content digest"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[Any]:
+        """Return the cached value for a digest, if any"""
+        with self._lock:
+            result = self._entries.get(digest)
+            if result is not None:
+                self._entries.move_to_end(digest)
+            return result
+
+    def set(self, digest: str, result: Any) -> None:
+        """Store a value, evicting the least recently used entry"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = result
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class OCRResultCache:
+    """In-process cache of OCR responses keyed by upload content hash, bounded by size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Kept serialized so each entry's size is exact; a response with inline
+        # previews can hold megabytes of base64, so an entry count bounds nothing
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[Dict]:
+        """Return the cached OCR response for a digest, if any"""
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is not None:
+                self._entries.move_to_end(digest)
+        return orjson.loads(payload) if payload is not None else None
+
+    def set(self, digest: str, result: Dict) -> None:
+        """Store an OCR response, evicting least recently used entries past max_bytes"""
+        payload = orjson.dumps(result)
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[digest] = payload
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class RedisOCRResultCache:
+    """OCR response cache shared across worker processes through Redis"""
+
+    def __init__(self, url: str, ttl: int, namespace: str = ''):
+        import redis
+
+        self.ttl = ttl
+        self.key_prefix = f'ocr:result:{namespace}:' if namespace else 'ocr:result:'
+        self._client = redis.Redis.from_url(url)
+        # The cache fails open: these count as a miss, not a failed request
+        self._errors = (redis.RedisError, orjson.JSONDecodeError)
+
+    def get(self, digest: str) -> Optional[Dict]:
+        """Return the cached OCR response for a digest, if any"""
+        try:
+            payload = self._client.get(self.key_prefix + digest)
+            return orjson.loads(payload) if payload is not None else None
+        except self._errors as e:
+            logger.warning(f"OCR cache lookup failed, treating as a miss: {e}")
+            return None
+
+    def set(self, digest: str, result: Dict) -> None:
+        """Store an OCR response with the configured expiry"""
+        try:
+            self._client.set(self.key_prefix + digest, orjson.dumps(result), ex=self.ttl)
+        except self._errors as e:
+            logger.warning(f"OCR cache store failed, result not cached: {e}")
+
+
+class DiskOCRResultCache:
+    """OCR response cache kept on local disk, surviving restarts and shared by local workers"""
+
+    def __init__(self, directory: Path, max_bytes: int, namespace: str = ''):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        # Entries of every namespace share the shards, so eviction also reclaims stale ones
+        self.name_prefix = f'{namespace}-' if namespace else ''
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Bytes written since the last eviction pass
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / f'{self.name_prefix}{digest}'
+
+    def get(self, digest: str) -> Optional[Dict]:
+        """Return the cached OCR response for a digest, if any"""
+        path = self._path(digest)
+        try:
+            payload = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"OCR cache lookup failed, treating as a miss: {e}")
+            return None
+
+        try:
+            # Mark the entry as recently used for eviction
+            os.utime(path)
+        except OSError:
+            # Evicted since the read; the payload is still good
+            pass
+
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"OCR cache entry {digest} is corrupt, treating as a miss: {e}")
+            return None
+
+    def set(self, digest: str, result: Dict) -> None:
+        """Store an OCR response, atomically replacing any existing entry"""
+        path = self._path(digest)
+        payload = orjson.dumps(result)
+        tmp_path = None
+        try:
+            path.parent.mkdir(exist_ok=True)
+            # Dot-prefixed temp names are skipped by eviction
+            with tempfile.NamedTemporaryFile(dir=path.parent, prefix='.', delete=False) as tmp:
+                tmp_path = Path(tmp.name)
+                tmp.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"OCR cache store failed, result not cached: {e}")
+            return
+        finally:
+            # Eviction never sees temp files, so a failed write must remove its own
+            if tmp_path is not None:
+                with suppress(OSError):
+                    tmp_path.unlink(missing_ok=True)
+
+        # Check the total size after every tenth of the budget written
+        with self._lock:
+            self._written += len(payload)
+            due = self._written >= self.max_bytes // 10
+            if due:
+                self._written = 0
+        if due:
+            try:
+                self._evict()
+            except OSError as e:
+                logger.warning(f"OCR cache eviction failed: {e}")
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class Coalescer:
+    """Shares one in-flight computation per key between concurrent callers"""
+
+    def __init__(self):
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Run compute once per key, sharing its result or exception with concurrent callers"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        return future.result()
+
+
+def create_ocr_cache(config):
+    """Create the OCR response cache selected by config"""
+    if config.OCR_CACHE_REDIS_URL:
+        return RedisOCRResultCache(config.OCR_CACHE_REDIS_URL, config.OCR_CACHE_TTL,
+                                   config_fingerprint(config))
+    if config.OCR_CACHE_DIR:
+        return DiskOCRResultCache(config.OCR_CACHE_DIR, config.OCR_CACHE_MAX_MB * 1024 * 1024,
+                                  config_fingerprint(config))
+    return OCRResultCache(config.OCR_CACHE_MEMORY_MB * 1024 * 1024)
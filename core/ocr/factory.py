@@ -1,24 +1,45 @@
-from typing import Dict, Type
+import threading
+from importlib import import_module
+from typing import Any, Dict, Tuple, Type, Union
 from .interface import OCREngine
-from .paddle_ocr import PaddleOCREngine
 
 class OCREngineFactory:
     """Factory for creating OCR engines"""
-    
-    _engines: Dict[str, Type[OCREngine]] = {
-        'paddle': PaddleOCREngine
+
+    # Built-in engines are given as "module:Class" and imported on first use,
+    # so importing the factory doesn't load Paddle and its op libraries
+    _engines: Dict[str, Union[str, Type[OCREngine]]] = {
+        'paddle': 'core.ocr.paddle_ocr:PaddleOCREngine'
         # Add other engines here as they're implemented
-        # 'tesseract': TesseractOCREngine,
-        # 'azure': AzureOCREngine,
+        # 'tesseract': 'core.ocr.tesseract_ocr:TesseractOCREngine',
+        # 'azure': 'core.ocr.azure_ocr:AzureOCREngine',
         # etc.
     }
 
+    # Engines already built in this process; each one holds its own model weights
+    _instances: Dict[Tuple[str, Any], OCREngine] = {}
+    _instances_lock = threading.Lock()
+
     @classmethod
     def create(cls, engine_name: str, config) -> OCREngine:
+        """Get the OCR engine instance for a config, building it once per process"""
+        key = (engine_name.lower(), config)
+        with cls._instances_lock:
+            engine = cls._instances.get(key)
+            if engine is None:
+                engine = cls._instances[key] = cls._build(key[0], config)
+        return engine
+
+    @classmethod
+    def _build(cls, engine_name: str, config) -> OCREngine:
         """Create an OCR engine instance"""
-        engine_class = cls._engines.get(engine_name.lower())
+        engine_class = cls._engines.get(engine_name)
         if not engine_class:
             raise ValueError(f"Unknown OCR engine: {engine_name}")
+        if isinstance(engine_class, str):
+            module_name, class_name = engine_class.split(':')
+            engine_class = getattr(import_module(module_name), class_name)
+            cls._engines[engine_name] = engine_class
         return engine_class(config)
 
     @classmethod
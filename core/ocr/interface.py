@@ -1,3 +1,4 @@
+import tempfile
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import Tuple, List, Dict
@@ -10,6 +11,10 @@ class OCREngine(ABC):
         """Initialize the OCR engine"""
         pass
     
+    def warmup(self) -> None:
+        """Run a throwaway inference so the first request skips one-time setup"""
+        pass
+
     @abstractmethod
     def process_image(self, image_path: Path) -> Tuple[List, str]:
         """
@@ -20,6 +25,17 @@ class OCREngine(ABC):
         """
         pass
     
+    def process_image_bytes(self, data: bytes) -> List[Dict]:
+        """
+        Process a single in-memory image
+        Returns: List of page data dictionaries with inline previews
+        Engines that can decode from memory should override this to skip the temp file
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_path = Path(tmp_dir) / 'image'
+            image_path.write_bytes(data)
+            return self.process_image(image_path)
+    
     @abstractmethod
     def process_pdf(self, pdf_path: Path, output_dir: Path) -> List[Dict]:
         """
@@ -1,77 +1,212 @@
+import importlib.util
+import io
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple, List, Dict
-import base64
+from queue import Full, Queue
+from typing import Deque, Tuple, List, Dict, Iterator, Union
+try:
+    # SIMD base64; same API as the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+import numpy as np
+import paddle
 from paddleocr import PaddleOCR
-import pdf2image
+from PIL import Image, ImageOps
 
-from .interface import OCREngine, OCRResult
+from .interface import OCREngine
 
 logger = logging.getLogger(__name__)
 
+# pdf2image is imported on first PDF so image-only workers never load it
+PDF_SUPPORT = importlib.util.find_spec('pdf2image') is not None
+
 class PaddleOCREngine(OCREngine):
     """PaddleOCR implementation"""
+
+    # Rendered pages buffered ahead of the OCR stage
+    PIPELINE_DEPTH = 4
     
     def __init__(self, config):
         self.config = config
-        self.engine = None
+        self.pool_size = max(1, config.OCR_POOL_SIZE)
+        # Preview URLs would point at files deleted right after OCR unless they are kept
+        self.inline_previews = config.INLINE_PREVIEWS or not config.KEEP_FILES
+        # Paddle predictors are not thread-safe; each call borrows a whole instance
+        self._engines: Queue = Queue()
+        # Spreads the pages of one PDF across the pooled engines
+        self._page_executor = ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix='ocr-page'
+        )
         self.supported_languages = ['ch', 'en', 'fr', 'german', 'korean', 'japan']
         self.initialize()
 
     def initialize(self) -> None:
-        """Initialize PaddleOCR engine"""
+        """Initialize the pool of PaddleOCR engines"""
         try:
-            self.engine = PaddleOCR(
-                use_angle_cls=self.config.USE_ANGLE_CLS,
-                lang=self.config.OCR_LANG
-            )
-            logger.info("PaddleOCR engine initialized successfully")
+            kwargs = self._engine_kwargs()
+            for _ in range(self.pool_size):
+                self._engines.put(PaddleOCR(**kwargs))
+            logger.info(f"PaddleOCR engine pool of {self.pool_size} initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize PaddleOCR: {e}", exc_info=True)
             raise
 
+    def warmup(self) -> None:
+        """Run OCR on a blank image to load models and initialize kernels"""
+        engines = [self._engines.get() for _ in range(self.pool_size)]
+        try:
+            start = time.perf_counter()
+            blank = np.zeros((640, 640, 3), dtype=np.uint8)
+            for engine in engines:
+                engine.ocr(blank, cls=self.config.USE_ANGLE_CLS)
+            logger.info(f"OCR warmup complete in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"PaddleOCR warmup failed: {e}", exc_info=True)
+        finally:
+            for engine in engines:
+                self._engines.put(engine)
+
+    @contextmanager
+    def _borrow_engine(self) -> Iterator[PaddleOCR]:
+        """Take a PaddleOCR instance from the pool for the duration of one call"""
+        engine = self._engines.get()
+        try:
+            yield engine
+        finally:
+            self._engines.put(engine)
+
+    def _engine_kwargs(self) -> Dict:
+        """Build PaddleOCR constructor arguments from config"""
+        kwargs = {
+            'use_angle_cls': self.config.USE_ANGLE_CLS,
+            'lang': self.config.OCR_LANG,
+            'ocr_version': self.config.OCR_VERSION,
+            'det_limit_side_len': self.config.OCR_DET_LIMIT_SIDE_LEN,
+            'det_limit_type': 'max'
+        }
+
+        # Custom (e.g. int8-quantized ONNX) models; unset dirs keep PaddleOCR's defaults
+        model_dirs = {
+            'det_model_dir': self.config.OCR_DET_MODEL_DIR,
+            'rec_model_dir': self.config.OCR_REC_MODEL_DIR,
+            'cls_model_dir': self.config.OCR_CLS_MODEL_DIR
+        }
+        kwargs.update({key: value for key, value in model_dirs.items() if value})
+        if self.config.OCR_USE_ONNX:
+            kwargs['use_onnx'] = True
+            if self.config.OCR_ONNX_PROVIDERS:
+                kwargs['onnx_providers'] = self.config.OCR_ONNX_PROVIDERS
+
+        if self._gpu_available():
+            logger.info("CUDA device found, running PaddleOCR on GPU")
+            if self.config.OCR_CUDNN_EXHAUSTIVE_SEARCH:
+                paddle.set_flags({'FLAGS_cudnn_exhaustive_search': True})
+            kwargs.update(
+                use_gpu=True,
+                use_tensorrt=self.config.OCR_USE_TENSORRT,
+                precision=self.config.OCR_GPU_PRECISION,
+                gpu_mem=self._gpu_mem_per_predictor(),
+                rec_batch_num=self.config.OCR_GPU_REC_BATCH_NUM,
+                cls_batch_num=self.config.OCR_GPU_REC_BATCH_NUM
+            )
+        else:
+            kwargs.update(
+                use_gpu=False,
+                enable_mkldnn=self.config.OCR_ENABLE_MKLDNN,
+                # The engines of every process split the cores between them
+                cpu_threads=max(
+                    1, self.config.OCR_CPU_THREADS // (self.config.OCR_PROCESSES * self.pool_size)
+                ),
+                precision=self.config.OCR_PRECISION,
+                rec_batch_num=self.config.OCR_REC_BATCH_NUM,
+                cls_batch_num=self.config.OCR_REC_BATCH_NUM
+            )
+        return kwargs
+
+    def _gpu_mem_per_predictor(self) -> int:
+        """Split OCR_GPU_MEM across every predictor created on this process's GPU"""
+        # PaddleOCR builds det and rec predictors, plus cls with angle classification
+        predictors = 3 if self.config.USE_ANGLE_CLS else 2
+        total = self.config.OCR_PROCESSES_PER_GPU * self.pool_size * predictors
+        return max(1, self.config.OCR_GPU_MEM // total)
+
+    @staticmethod
+    def _gpu_available() -> bool:
+        """Check whether Paddle was built with CUDA and can see a GPU"""
+        try:
+            return paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+        except Exception as e:
+            logger.warning(f"GPU detection failed, using CPU: {e}")
+            return False
+
     def process_image(self, image_path: Path) -> List[Dict]:
         """Process single image with PaddleOCR"""
-        pages_data = []
-
         try:
             logger.info(f"Processing image: {image_path}")
-            structured_data, raw_text = self.scan_image(image_path)
-            preview_data = self._get_base64_image(image_path)
-                
-            pages_data.append({
-                    'page': 0,
-                    'preview': f"data:image/jpeg;base64,{preview_data}",
-                    'data': structured_data,
-                    'raw': raw_text
-            })
-            
-            return pages_data
+            if self.inline_previews:
+                # Read the file once for both the decode and the base64 preview
+                data = Path(image_path).read_bytes()
+                image, scale = self._load_image(io.BytesIO(data))
+                preview = self._inline_preview(data)
+            else:
+                image, scale = self._load_image(image_path)
+                preview = self._get_preview(image_path)
+            return [self._ocr_page(0, preview, image, scale)]
 
         except Exception as e:
             logger.error(f"PaddleOCR processing error: {e}", exc_info=True)
             raise
 
-    def scan_image(self, image_path: Path) -> Tuple[List, str]:
-        """Process single image with PaddleOCR"""
+    def process_image_bytes(self, data: bytes) -> List[Dict]:
+        """Process an in-memory image with PaddleOCR"""
         try:
-            logger.info(f"Processing image: {image_path}")
-            result = self.engine.ocr(str(image_path), cls=True)
+            logger.info(f"Processing in-memory image ({len(data)} bytes)")
+            image, scale = self._load_image(io.BytesIO(data))
+            structured_data, raw_text = self.scan_image(image)
+
+            return [{
+                'page': 0,
+                'preview': self._inline_preview(data),
+                'data': self._rescale_boxes(structured_data, scale),
+                'raw': raw_text
+            }]
+
+        except Exception as e:
+            logger.error(f"PaddleOCR processing error: {e}", exc_info=True)
+            raise
+
+    def scan_image(self, image: Union[Path, np.ndarray]) -> Tuple[List, str]:
+        """Process single image (a path or a BGR ndarray) with PaddleOCR"""
+        try:
+            if isinstance(image, np.ndarray):
+                logger.debug("Processing image array: %s", image.shape)
+                ocr_input = image
+            else:
+                logger.debug("Processing image: %s", image)
+                ocr_input = str(image)
+
+            with self._borrow_engine() as engine:
+                result = engine.ocr(ocr_input, cls=self.config.USE_ANGLE_CLS)
             
-            structured_data = []
-            raw_text = []
-
-            for block_idx, res in enumerate(result):
-                for line in res:
-                    if len(line) >= 2:
-                        coords, (text, confidence) = line
-                        ocr_result = OCRResult(
-                            text=text,
-                            confidence=float(confidence),
-                            coordinates=coords
-                        )
-                        structured_data.append([coords, [text, float(confidence)]])
-                        raw_text.append(text)
+            # PaddleOCR yields None for images without detected text
+            lines = [line for res in result if res for line in res if len(line) >= 2]
+            raw_text = [line[1][0] for line in lines]
+            confidences = np.fromiter(
+                (line[1][1] for line in lines), dtype=np.float64, count=len(lines)
+            ).tolist()
+            structured_data = [
+                [line[0], [text, confidence]]
+                for line, text, confidence in zip(lines, raw_text, confidences)
+            ]
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Recognized %d text lines", len(raw_text))
 
             return structured_data, '\n'.join(raw_text)
 
@@ -80,32 +215,148 @@ class PaddleOCREngine(OCREngine):
             raise
 
     def process_pdf(self, pdf_path: Path, output_dir: Path) -> List[Dict]:
-        """Process PDF document"""
+        """Process PDF document, overlapping page rendering with OCR"""
+        if not PDF_SUPPORT:
+            raise RuntimeError("PDF support requires the pdf2image package")
+
+        page_queue: Queue = Queue(maxsize=self.PIPELINE_DEPTH)
+        stop = threading.Event()
+        renderer = threading.Thread(
+            target=self._render_pages,
+            args=(pdf_path, output_dir, page_queue, stop),
+            name="pdf-renderer",
+            daemon=True
+        )
+
+        futures: List[Future] = []
         try:
             logger.info(f"Converting PDF: {pdf_path}")
-            images = pdf2image.convert_from_path(str(pdf_path))
-            
-            pages_data = []
-            for i, image in enumerate(images, 1):
-                preview_path = output_dir / f"page_{i}.jpg"
-                image.save(preview_path, 'JPEG')
-                
-                structured_data, raw_text = self.scan_image(preview_path)
-                preview_data = self._get_base64_image(preview_path)
-                
-                pages_data.append({
-                    'page': i,
-                    'preview': f"data:image/jpeg;base64,{preview_data}",
-                    'data': structured_data,
-                    'raw': raw_text
-                })
-            
-            return pages_data
+            renderer.start()
+
+            in_flight: Deque[Future] = deque()
+            while True:
+                item = page_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                page_number, preview, page_array = item
+                future = self._page_executor.submit(self._ocr_page, page_number, preview, page_array)
+                futures.append(future)
+                in_flight.append(future)
+                # Hold no more decoded pages than the engines can work on
+                while len(in_flight) > self.pool_size:
+                    in_flight.popleft().result()
+
+            return [future.result() for future in futures]
 
         except Exception as e:
+            # Free the shared page executor for other requests
+            for future in futures:
+                future.cancel()
             logger.error(f"PDF processing error: {e}", exc_info=True)
             raise
 
+        finally:
+            stop.set()
+            renderer.join()
+
+    def _render_pages(self, pdf_path: Path, output_dir: Path, page_queue: Queue,
+                      stop: threading.Event) -> None:
+        """Render PDF pages to JPEG previews and hand them to the OCR stage"""
+        try:
+            import pdf2image
+
+            page_count = pdf2image.pdfinfo_from_path(str(pdf_path))['Pages']
+            # Render chunks of pages with one Poppler process per page so OCR
+            # can start on the first chunk while the rest are still rendering
+            chunk_size = max(1, self.config.PDF_RENDER_THREADS)
+            for first_page in range(1, page_count + 1, chunk_size):
+                if stop.is_set():
+                    return
+                last_page = min(first_page + chunk_size - 1, page_count)
+                # Poppler hands the pages over losslessly (PPM through a pipe), so OCR
+                # never sees JPEG artifacts; only the preview is encoded as JPEG
+                pages = pdf2image.convert_from_path(
+                    str(pdf_path),
+                    dpi=self.config.PDF_DPI,
+                    first_page=first_page,
+                    last_page=last_page,
+                    thread_count=last_page - first_page + 1,
+                    use_pdftocairo=self.config.PDF_USE_PDFTOCAIRO
+                )
+                for i, page in enumerate(pages, first_page):
+                    with page:
+                        # Previews are built here, while OCR runs on earlier pages
+                        preview = self._page_preview(page, output_dir / f"page_{i}.jpg")
+                        page_array = self._to_bgr(page)
+                    self._put_page(page_queue, (i, preview, page_array), stop)
+        except Exception as e:
+            self._put_page(page_queue, e, stop)
+            return
+        self._put_page(page_queue, None, stop)
+
+    def _page_preview(self, page: Image.Image, preview_path: Path) -> str:
+        """Encode a rendered page as its JPEG preview, inline or saved for /uploads"""
+        if self.inline_previews:
+            # Inline previews never touch disk
+            buffer = io.BytesIO()
+            page.save(buffer, 'JPEG', quality=self.config.PDF_JPEG_QUALITY)
+            return self._inline_preview(buffer.getvalue())
+        page.save(preview_path, 'JPEG', quality=self.config.PDF_JPEG_QUALITY)
+        return self._get_preview(preview_path)
+
+    def _load_image(self, source) -> Tuple[np.ndarray, float]:
+        """Decode an upright BGR image capped at OCR_MAX_LONG_EDGE, with the factor back to source pixels"""
+        with Image.open(source) as image:
+            long_edge = max(image.size)
+            limit = self.config.OCR_MAX_LONG_EDGE
+            oversized = bool(limit) and long_edge > limit
+            if oversized:
+                # JPEGs decode straight at a reduced scale
+                image.draft('RGB', (limit, limit))
+            image = ImageOps.exif_transpose(image)
+            if oversized:
+                # Detection resizes to OCR_DET_LIMIT_SIDE_LEN anyway; this also shrinks the recognition crops
+                image.thumbnail((limit, limit), Image.Resampling.LANCZOS)
+            return self._to_bgr(image), long_edge / max(image.size)
+
+    @staticmethod
+    def _rescale_boxes(structured_data: List, scale: float) -> List:
+        """Map text box coordinates from a downscaled image back to source pixels"""
+        if scale == 1.0:
+            return structured_data
+        return [
+            [[[x * scale, y * scale] for x, y in box], recognition]
+            for box, recognition in structured_data
+        ]
+
+    @staticmethod
+    def _to_bgr(image: Image.Image) -> np.ndarray:
+        """Convert a PIL image to the contiguous BGR array PaddleOCR expects"""
+        return np.ascontiguousarray(np.asarray(image.convert('RGB'))[:, :, ::-1])
+
+    @staticmethod
+    def _put_page(page_queue: Queue, item, stop: threading.Event) -> None:
+        """Queue an item for the OCR stage unless the pipeline was stopped"""
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _ocr_page(self, page_number: int, preview: str, image: np.ndarray,
+                  scale: float = 1.0) -> Dict:
+        """OCR one page image and build its response entry"""
+        structured_data, raw_text = self.scan_image(image)
+        return {
+            'page': page_number,
+            'preview': preview,
+            'data': self._rescale_boxes(structured_data, scale),
+            'raw': raw_text
+        }
+
     def get_supported_languages(self) -> List[str]:
         """Get supported languages"""
         return self.supported_languages
@@ -114,8 +365,14 @@ class PaddleOCREngine(OCREngine):
         """Get engine name"""
         return "PaddleOCR"
 
+    def _get_preview(self, image_path: Path) -> str:
+        """Get the preview reference for a page image"""
+        if self.inline_previews:
+            return self._inline_preview(Path(image_path).read_bytes())
+        relative_path = Path(image_path).relative_to(self.config.UPLOAD_FOLDER)
+        return f"/uploads/{relative_path.as_posix()}"
+
     @staticmethod
-    def _get_base64_image(image_path: Path) -> str:
-        """Convert image to base64 string"""
-        with open(image_path, 'rb') as img_file:
-            return base64.b64encode(img_file.read()).decode('utf-8')
\ No newline at end of file
+    def _inline_preview(data: bytes) -> str:
+        """Convert JPEG bytes to a base64 data URI"""
+        return f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}"
\ No newline at end of file
@@ -7,12 +7,8 @@ pip install -r requirements.txt
 # Set environment variables
 export FLASK_ENV=production
 export SECRET_KEY=your-production-secret-key
+# Spread workers across GPUs, e.g. OCR_GPUS=0,1
+export OCR_GPUS=${OCR_GPUS:-}
 
-# Run with gunicorn
-gunicorn --bind 0.0.0.0:8000 \
-         --workers 4 \
-         --threads 2 \
-         --timeout 120 \
-         --access-logfile logs/access.log \
-         --error-logfile logs/error.log \
-         "app:create_app()"
\ No newline at end of file
+# Run with gunicorn (see gunicorn_conf.py)
+gunicorn -c gunicorn_conf.py "app:create_app('production')"
@@ -0,0 +1,35 @@
+import os
+
+# Server socket
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+
+# Worker processes
+# Each worker holds its own OCR engine pool, so scale with the cores
+workers = int(os.getenv('GUNICORN_WORKERS', max(2, (os.cpu_count() or 1) // 2)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Workers inherit these, so each sizes its OCR pool and threads for its share of the machine
+# and its analysis cap for its request threads
+os.environ.setdefault('OCR_PROCESSES', str(workers))
+os.environ.setdefault('GUNICORN_THREADS', str(threads))
+timeout = 120
+
+# Load the app (and its OCR models) in each worker after fork
+preload_app = False
+
+# Logging
+accesslog = 'logs/access.log'
+errorlog = 'logs/error.log'
+
+# GPU ids to spread workers across, e.g. "0,1"; empty leaves device selection to Paddle
+_gpus = [gpu.strip() for gpu in os.getenv('OCR_GPUS', '').split(',') if gpu.strip()]
+# Without pinning every worker lands on the default GPU
+os.environ.setdefault('OCR_PROCESSES_PER_GPU', str(-(-workers // len(_gpus)) if _gpus else workers))
+
+def post_fork(server, worker):
+    """Pin each worker to one GPU before it initializes PaddleOCR"""
+    if _gpus:
+        gpu = _gpus[(worker.age - 1) % len(_gpus)]
+        os.environ['CUDA_VISIBLE_DEVICES'] = gpu
+        server.log.info(f"Worker {worker.pid} pinned to GPU {gpu}")
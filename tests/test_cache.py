@@ -0,0 +1,184 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from core.cache import Coalescer, DiskOCRResultCache, OCRResultCache, config_fingerprint
+
+
+class CoalescerTest(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_run(self):
+        coalescer = Coalescer()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {'pages': []}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(coalescer.run('digest', compute)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        # Let every caller reach the in-flight run before it finishes
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_callers_share_the_exception_and_the_key_is_released(self):
+        coalescer = Coalescer()
+        release = threading.Event()
+        errors = []
+
+        def failing():
+            release.wait(5)
+            raise RuntimeError('ocr failed')
+
+        def call():
+            try:
+                coalescer.run('digest', failing)
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(all(error is errors[0] for error in errors))
+        # A failed run doesn't stick; the next caller computes again
+        self.assertEqual(coalescer.run('digest', lambda: 'retried'), 'retried')
+
+    def test_different_keys_run_separately(self):
+        coalescer = Coalescer()
+        self.assertEqual(coalescer.run('a', lambda: 1), 1)
+        self.assertEqual(coalescer.run('b', lambda: 2), 2)
+
+
+class OCRResultCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used_past_max_bytes(self):
+        # Room for two of the 54-byte responses below
+        cache = OCRResultCache(150)
+        cache.set('a', {'preview': 'a' * 40})
+        cache.set('b', {'preview': 'b' * 40})
+        cache.get('a')
+        cache.set('c', {'preview': 'c' * 40})
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_skips_responses_larger_than_the_budget(self):
+        cache = OCRResultCache(100)
+        cache.set('big', {'preview': 'x' * 200})
+        self.assertIsNone(cache.get('big'))
+
+    def test_returns_a_copy(self):
+        cache = OCRResultCache(1024)
+        cache.set('a', {'pages': []})
+        cache.get('a')['pages'].append('mutated')
+        self.assertEqual(cache.get('a'), {'pages': []})
+
+
+class DiskOCRResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+
+    def digest(self, char):
+        return char * 64
+
+    def test_round_trip_and_miss(self):
+        cache = DiskOCRResultCache(self.directory, 1024 * 1024)
+        cache.set(self.digest('a'), {'pages': [1]})
+        self.assertEqual(cache.get(self.digest('a')), {'pages': [1]})
+        self.assertIsNone(cache.get(self.digest('b')))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = DiskOCRResultCache(self.directory, 1024 * 1024)
+        cache.set(self.digest('a'), {'pages': [1]})
+        cache._path(self.digest('a')).write_bytes(b'{not json')
+        with self.assertLogs('core.cache', 'WARNING'):
+            self.assertIsNone(cache.get(self.digest('a')))
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskOCRResultCache(self.directory, 1024 * 1024)
+        for age, char in enumerate('abc'):
+            cache.set(self.digest(char), {'preview': char * 100})
+            # Oldest first: a, then b, then c
+            mtime = time.time() - 100 + age
+            os.utime(cache._path(self.digest(char)), (mtime, mtime))
+        # Reading a marks it as recently used
+        cache.get(self.digest('a'))
+
+        entry_size = cache._path(self.digest('b')).stat().st_size
+        cache.max_bytes = entry_size * 2
+        cache._evict()
+
+        self.assertIsNotNone(cache.get(self.digest('a')))
+        self.assertIsNone(cache.get(self.digest('b')))
+        self.assertIsNotNone(cache.get(self.digest('c')))
+
+    def test_eviction_ignores_temp_files(self):
+        cache = DiskOCRResultCache(self.directory, 1)
+        shard = self.directory / 'aa'
+        shard.mkdir()
+        (shard / '.in-progress').write_bytes(b'x' * 10)
+        cache._evict()
+        self.assertTrue((shard / '.in-progress').exists())
+
+    def test_failed_write_leaves_no_temp_file(self):
+        cache = DiskOCRResultCache(self.directory, 1024 * 1024)
+        digest = self.digest('a')
+        # A directory in the entry's place makes the rename fail
+        cache._path(digest).mkdir(parents=True)
+        with self.assertLogs('core.cache', 'WARNING'):
+            cache.set(digest, {'pages': []})
+        self.assertEqual(sorted(p.name for p in cache._path(digest).parent.iterdir()), [digest])
+
+    def test_namespaces_keep_entries_apart(self):
+        first = DiskOCRResultCache(self.directory, 1024 * 1024, 'first')
+        second = DiskOCRResultCache(self.directory, 1024 * 1024, 'second')
+        first.set(self.digest('a'), {'pages': [1]})
+        self.assertIsNone(second.get(self.digest('a')))
+
+
+class ConfigFingerprintTest(unittest.TestCase):
+
+    def test_changes_with_ocr_settings_only(self):
+        class Base:
+            OCR_LANG = 'ch'
+            PDF_DPI = 150
+            SECRET_KEY = 'a'
+
+        class OtherDpi(Base):
+            PDF_DPI = 200
+
+        class OtherSecret(Base):
+            SECRET_KEY = 'b'
+
+        self.assertNotEqual(config_fingerprint(Base), config_fingerprint(OtherDpi))
+        self.assertEqual(config_fingerprint(Base), config_fingerprint(OtherSecret))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from utils.helpers import (
+    allowed_file, allowed_suffixes, cleanup_dir, create_upload_dir, matches_signature,
+    save_upload, sweep_uploads
+)
+
+
+class FakeUpload:
+    """Minimal stand-in for a Werkzeug FileStorage"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def save(self, dst, buffer_size=16384):
+        with open(dst, 'wb') as out:
+            out.write(self.stream.read())
+
+
+class SweepUploadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.base_dir = Path(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+
+    def make_upload(self, age):
+        upload_dir = create_upload_dir(self.base_dir)
+        (upload_dir / 'page_1.jpg').write_bytes(b'jpeg')
+        mtime = time.time() - age
+        os.utime(upload_dir, (mtime, mtime))
+        return upload_dir
+
+    def test_removes_only_dirs_past_retention(self):
+        expired = self.make_upload(age=7200)
+        fresh = self.make_upload(age=60)
+
+        self.assertEqual(sweep_uploads(self.base_dir, 3600), 1)
+        self.assertFalse(expired.exists())
+        self.assertTrue(fresh.exists())
+
+    def test_ignores_files_and_dirs_outside_the_shard_layout(self):
+        spool = self.base_dir / '.incoming'
+        spool.mkdir()
+        stray = self.base_dir / 'notes.txt'
+        stray.write_text('keep')
+        old = time.time() - 7200
+        os.utime(spool, (old, old))
+        os.utime(stray, (old, old))
+
+        self.assertEqual(sweep_uploads(self.base_dir, 3600), 0)
+        self.assertTrue(spool.exists())
+        self.assertTrue(stray.exists())
+
+    def test_cleanup_keeps_shard_dirs(self):
+        upload_dir = self.make_upload(age=0)
+        cleanup_dir(upload_dir)
+        self.assertFalse(upload_dir.exists())
+        # A concurrent create_upload_dir may be using the shard
+        self.assertTrue(upload_dir.parent.is_dir())
+
+
+class SaveUploadTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+
+    def test_saves_in_memory_stream(self):
+        target = self.directory / 'upload.png'
+        save_upload(FakeUpload(io.BytesIO(b'content')), target)
+        self.assertEqual(target.read_bytes(), b'content')
+        self.assertEqual(os.listdir(self.directory), ['upload.png'])
+
+    def test_hard_links_spooled_file(self):
+        spooled = tempfile.NamedTemporaryFile('w+b', dir=self.directory)
+        self.addCleanup(spooled.close)
+        spooled.write(b'spooled')
+        target = self.directory / 'upload.pdf'
+
+        save_upload(FakeUpload(spooled), target)
+
+        self.assertEqual(target.read_bytes(), b'spooled')
+        self.assertEqual(target.stat().st_ino, os.stat(spooled.name).st_ino)
+
+    def test_failed_write_leaves_nothing_behind(self):
+        class BrokenUpload(FakeUpload):
+            def save(self, dst, buffer_size=16384):
+                Path(dst).write_bytes(b'partial')
+                raise OSError('disk full')
+
+        target = self.directory / 'upload.png'
+        with self.assertRaises(OSError):
+            save_upload(BrokenUpload(io.BytesIO(b'content')), target)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class UploadValidationTest(unittest.TestCase):
+
+    def test_allowed_file_normalizes_extensions(self):
+        suffixes = allowed_suffixes({'.PDF', 'jpg'})
+        self.assertTrue(allowed_file('scan.pdf', suffixes))
+        self.assertTrue(allowed_file('SCAN.JPG', suffixes))
+        self.assertFalse(allowed_file('scan.gif', suffixes))
+
+    def test_image_extensions_accept_any_supported_image(self):
+        png = io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'\0' * 16)
+        self.assertTrue(matches_signature(png, 'jpg'))
+        self.assertEqual(png.tell(), 0)
+        self.assertTrue(matches_signature(io.BytesIO(b'\xff\xd8\xff\xe0'), 'png'))
+
+    def test_rejects_empty_and_mismatched_content(self):
+        self.assertFalse(matches_signature(io.BytesIO(b''), 'jpg'))
+        self.assertFalse(matches_signature(io.BytesIO(b'%PDF-1.7'), 'png'))
+        self.assertFalse(matches_signature(io.BytesIO(b'\x89PNG\r\n\x1a\n'), 'pdf'))
+
+    def test_pdf_header_may_follow_a_preamble(self):
+        self.assertTrue(matches_signature(io.BytesIO(b'\r\n%PDF-1.4\n'), 'pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,105 @@
-from datetime import datetime
+import hashlib
 import os
+import secrets
+import shutil
+import time
 from pathlib import Path
 
 def create_upload_dir(base_dir: Path) -> Path:
-    """Create a timestamped upload directory"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-    upload_path = base_dir / timestamp
+    """Create a unique upload directory, sharded two levels deep"""
+    token = secrets.token_hex(16)
+    upload_path = base_dir / token[:2] / token[2:4] / token
     upload_path.mkdir(parents=True, exist_ok=True)
     return upload_path
 
-def allowed_file(filename: str, allowed_extensions: set) -> bool:
-    """Check if the file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in allowed_extensions
+def allowed_suffixes(allowed_extensions) -> tuple:
+    """Turn extensions (any case, dotted or not) into the lowercase suffixes allowed_file checks"""
+    return tuple(f".{ext.lower().lstrip('.')}" for ext in allowed_extensions)
+
+def allowed_file(filename: str, suffixes: tuple) -> bool:
+    """Check if the file extension is allowed (suffixes from allowed_suffixes)"""
+    return filename.lower().endswith(suffixes)
+
+# Leading bytes of each supported image type; PIL decodes by content, so any of
+# them is accepted under any image extension (a PNG saved as .jpg OCRs fine)
+IMAGE_SIGNATURES = {
+    'jpg': b'\xff\xd8\xff',
+    'jpeg': b'\xff\xd8\xff',
+    'png': b'\x89PNG\r\n\x1a\n'
+}
+# PDFs may have a short preamble before the header
+PDF_SIGNATURE = b'%PDF-'
+
+def matches_signature(stream, extension: str) -> bool:
+    """Check a stream holds the kind of file its extension says, and rewind it"""
+    if extension == 'pdf':
+        head = stream.read(1024)
+        stream.seek(0)
+        return PDF_SIGNATURE in head
+    if extension in IMAGE_SIGNATURES:
+        head = stream.read(max(len(signature) for signature in IMAGE_SIGNATURES.values()))
+        stream.seek(0)
+        return head.startswith(tuple(IMAGE_SIGNATURES.values()))
+    return True
 
 def cleanup_dir(directory: Path) -> None:
     """Safely remove a directory and its contents"""
+    # Shard dirs are left in place: pruning one could race a create_upload_dir that
+    # just made it, and there are at most 65536 of them
     if directory.exists():
-        import shutil
-        shutil.rmtree(directory)
\ No newline at end of file
+        shutil.rmtree(directory)
+
+def sweep_uploads(base_dir: Path, max_age: float) -> int:
+    """Remove upload directories untouched for max_age seconds, returning how many were removed"""
+    cutoff = time.time() - max_age
+    removed = 0
+    # Only the sharded upload dirs from create_upload_dir match
+    for upload_dir in base_dir.glob('??/??/*'):
+        try:
+            if not upload_dir.is_dir() or upload_dir.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        # Another worker may be sweeping the same dir
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        removed += 1
+    return removed
+
+def save_upload(file, filepath: Path) -> None:
+    """Save an uploaded file, hard-linking its spooled temp file when possible"""
+    src = getattr(file.stream, '_file', None) or file.stream
+    src_path = getattr(src, 'name', None)
+    spooled = isinstance(src_path, str) and Path(src_path).is_file()
+    if spooled:
+        src.flush()
+        try:
+            os.link(src_path, filepath)
+            return
+        except OSError:
+            pass
+
+    # Copies are written beside the target and renamed into place, so a partial
+    # write never shows up under the upload's name
+    tmp_path = filepath.with_name(f".{filepath.name}.tmp")
+    try:
+        copied = False
+        if spooled:
+            try:
+                # Across filesystems, let the kernel copy (sendfile/copy_file_range)
+                shutil.copyfile(src_path, tmp_path)
+                copied = True
+            except OSError:
+                pass
+        if not copied:
+            file.save(tmp_path, buffer_size=1024 * 1024)
+        os.replace(tmp_path, filepath)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def stream_sha256(stream, chunk_size: int = 8 * 1024 * 1024) -> str:
+    """Compute the SHA-256 digest of a binary stream and rewind it"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
\ No newline at end of file
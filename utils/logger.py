@@ -1,13 +1,16 @@
+import atexit
 import logging
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 def setup_logger(app):
     """Configure application logging"""
     log_dir = Path(app.root_path) / 'logs'
     log_dir.mkdir(exist_ok=True)
     log_file = log_dir / 'ocr_app.log'
+    log_level = app.config.get('LOG_LEVEL', 'DEBUG')
 
     formatter = logging.Formatter(
         '[%(asctime)s] [%(levelname)8s] %(filename)s:%(lineno)d - %(message)s',
@@ -22,22 +25,32 @@ def setup_logger(app):
         encoding='utf-8'
     )
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.DEBUG)
+    file_handler.setLevel(log_level)
 
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.DEBUG if app.debug else logging.INFO)
+    console_handler.setLevel(log_level)
+
+    # Handlers run on a listener thread; request threads only enqueue records
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
     # Root logger configuration
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.setLevel(log_level)
+    root_logger.addHandler(QueueHandler(log_queue))
 
     # Log startup information
-    app.logger.info("="*50)
-    app.logger.info("Starting OCR Application")
-    app.logger.info("="*50)
+    if app.debug:
+        app.logger.info("="*50)
+        app.logger.info("Starting OCR Application")
+        app.logger.info("="*50)
+    else:
+        app.logger.info("Starting OCR Application")
 
     return root_logger
\ No newline at end of file
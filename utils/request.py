@@ -0,0 +1,20 @@
+import tempfile
+
+from flask import Request, current_app
+
+
+class UploadRequest(Request):
+    """Request that spools large uploads to named temp files in UPLOAD_SPOOL_FOLDER"""
+
+    # Uploads up to this size stay in memory, as with Werkzeug's default factory
+    spool_threshold = 500 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        """Spool to a named file on the upload filesystem so it can be hard-linked"""
+        if total_content_length is not None and total_content_length <= self.spool_threshold:
+            return super()._get_file_stream(total_content_length, content_type,
+                                            filename, content_length)
+
+        # The directory is created once by create_app
+        return tempfile.NamedTemporaryFile('w+b', dir=current_app.config['UPLOAD_SPOOL_FOLDER'])